@@ -3,15 +3,179 @@ QR Contact Card Generator - Flask Web Application
 Sompalli & Co | CA Community Tool
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
-import qrcode
-from qrcode.constants import ERROR_CORRECT_H
-from PIL import Image, ImageDraw, ImageFont
+from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask.json.provider import JSONProvider
+import orjson
+import segno
+from segno.consts import MODE_ALPHANUMERIC, MODE_BYTE, MODE_NUMERIC
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 import io
 import base64
+import concurrent.futures
+import functools
 import os
+import re
+import threading
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify()."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping a str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# zlib effort for the PNG writer; QR images barely shrink past level 1
+QR_PNG_COMPRESS_LEVEL = int(os.environ.get("QR_PNG_LEVEL", "1"))
+
+
+def _load_fonts():
+    """Load the banner fonts, falling back to PIL's default bitmap font."""
+    try:
+        font_name   = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 17)
+        font_sub    = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
+        font_scan   = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf", 10)
+    except IOError:
+        font_name = font_sub = font_scan = ImageFont.load_default()
+    return font_name, font_sub, font_scan
+
+
+# Fonts are parsed once per process rather than on every request
+FONT_NAME, FONT_SUB, FONT_SCAN = _load_fonts()
+
+BANNER_TITLE = "Scan to Save Contact"
+BANNER_SUB   = "📱 vCard Contact QR Code"
+BANNER_SCAN  = "Works with iPhone & Android Camera"
+
+
+def _measure_width(draw, text, font):
+    bb = draw.textbbox((0, 0), text, font=font)
+    return bb[2] - bb[0]
+
+
+# The banner strings never change, so measure them once instead of per request
+_measure_draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+BANNER_WIDTHS = {
+    (text, font): _measure_width(_measure_draw, text, font)
+    for text, font in ((BANNER_TITLE, FONT_NAME), (BANNER_SUB, FONT_SUB), (BANNER_SCAN, FONT_SCAN))
+}
+del _measure_draw
+
+COLOR_SCHEMES = {
+    "navy":   {"fill": "#0D2B55", "back": "#FFFFFF", "banner": "#0D2B55", "accent": "#F5C842"},
+    "green":  {"fill": "#1A4731", "back": "#FFFFFF", "banner": "#1A4731", "accent": "#4ADE80"},
+    "maroon": {"fill": "#6B0F1A", "back": "#FFFFFF", "banner": "#6B0F1A", "accent": "#FCA5A5"},
+    "black":  {"fill": "#111111", "back": "#FFFFFF", "banner": "#111111", "accent": "#F59E0B"},
+    "purple": {"fill": "#3B0764", "back": "#FFFFFF", "banner": "#3B0764", "accent": "#C084FC"},
+}
+
+QR_BOX_SIZE = 10
+QR_BORDER   = 4
+BANNER_H    = 80
+
+# Runs long enough to be worth a QR mode switch; 20 is the threshold the
+# qrcode package's add_data() uses, so symbols come out the same version
+_QR_ALNUM_RUN   = re.compile(r"[0-9A-Z $%*+\-./:]{20,}")
+_QR_NUMERIC_RUN = re.compile(r"[0-9]{20,}")
+
+
+def _qr_segments(text):
+    """Split text into (content, mode) segments: numeric, alphanumeric or byte."""
+    segments = []
+    pos = 0
+    for alnum in _QR_ALNUM_RUN.finditer(text):
+        if alnum.start() > pos:
+            segments.append((text[pos:alnum.start()], MODE_BYTE))
+        chunk, chunk_pos = alnum.group(), 0
+        for num in _QR_NUMERIC_RUN.finditer(chunk):
+            if num.start() > chunk_pos:
+                segments.append((chunk[chunk_pos:num.start()], MODE_ALPHANUMERIC))
+            segments.append((num.group(), MODE_NUMERIC))
+            chunk_pos = num.end()
+        if chunk_pos < len(chunk):
+            segments.append((chunk[chunk_pos:], MODE_ALPHANUMERIC))
+        pos = alnum.end()
+    if pos < len(text):
+        segments.append((text[pos:], MODE_BYTE))
+    return segments
+
+# Blend steps from the banner colour to each text colour, so anti-aliased
+# glyph edges land on a matching shade; 3 + 3 * 4 entries fit a 4-bit PNG
+PALETTE_RAMP_STEPS = 4
+
+
+def _scheme_palette(scheme):
+    """Build the fixed palette for a scheme: back, fill, banner, then text ramps."""
+    banner = ImageColor.getrgb(scheme["banner"])
+    entries = [ImageColor.getrgb(scheme["back"]), ImageColor.getrgb(scheme["fill"]), banner]
+    for text_color in (scheme["accent"], "#FFFFFF", "#AACBFF"):
+        text_rgb = ImageColor.getrgb(text_color)
+        for step in range(1, PALETTE_RAMP_STEPS + 1):
+            t = step / PALETTE_RAMP_STEPS
+            entries.append(tuple(round(b + (c - b) * t) for b, c in zip(banner, text_rgb)))
+    return [channel for rgb in entries for channel in rgb]
+
+
+# Palette index 0 is the QR light colour and 1 the dark colour, matching the
+# 0/1 module values, so QR pixels can be pasted straight into the card
+SCHEME_PALETTES = {name: _scheme_palette(scheme) for name, scheme in COLOR_SCHEMES.items()}
+
+# Rendered banner strips, keyed by scheme name then QR image width
+BANNER_STRIPS = {name: {} for name in COLOR_SCHEMES}
+
+
+def _banner_strip(scheme_name, width):
+    """Return the static banner for a scheme and width, drawing it on first use."""
+    strip = BANNER_STRIPS[scheme_name].get(width)
+    if strip is not None:
+        return strip
+
+    scheme = COLOR_SCHEMES[scheme_name]
+    strip = Image.new("RGB", (width, BANNER_H), scheme["banner"])
+    draw = ImageDraw.Draw(strip)
+
+    def cx(text, font):
+        return (width - BANNER_WIDTHS[(text, font)]) // 2
+
+    draw.text((cx(BANNER_TITLE, FONT_NAME), 8),
+              BANNER_TITLE, font=FONT_NAME, fill=scheme["accent"])
+    draw.text((cx(BANNER_SUB, FONT_SUB), 32),
+              BANNER_SUB, font=FONT_SUB, fill="#FFFFFF")
+    draw.text((cx(BANNER_SCAN, FONT_SCAN), 56),
+              BANNER_SCAN, font=FONT_SCAN, fill="#AACBFF")
+
+    # Map onto the scheme palette once, here, rather than on every render
+    palette = Image.new("P", (1, 1))
+    palette.putpalette(SCHEME_PALETTES[scheme_name])
+    strip = strip.quantize(palette=palette, dither=Image.Dither.NONE)
+
+    return BANNER_STRIPS[scheme_name].setdefault(width, strip)
+
+
+# (form key, vCard line template) in output order; "name" is handled separately
+VCARD_FIELDS = [
+    ("org",      "ORG:{}"),
+    ("title",    "TITLE:{}"),
+    ("phone",    "TEL;TYPE=CELL:{}"),
+    ("phone2",   "TEL;TYPE=WORK:{}"),
+    ("email",    "EMAIL;TYPE=INTERNET:{}"),
+    ("website",  "URL:{}"),
+    ("address",  "ADR;TYPE=WORK:;;{};;;;"),
+    ("linkedin", "X-SOCIALPROFILE;type=linkedin:{}"),
+    ("note",     "NOTE:{}"),
+]
+
 
 def build_vcard(data):
     """Build a vCard 3.0 string from form data."""
@@ -25,89 +189,76 @@ def build_vcard(data):
         lines.append(f"FN:{full_name}")
         lines.append(f"N:{last};{first};;;")
 
-    if data.get("org"):
-        lines.append(f"ORG:{data['org'].strip()}")
-    if data.get("title"):
-        lines.append(f"TITLE:{data['title'].strip()}")
-    if data.get("phone"):
-        lines.append(f"TEL;TYPE=CELL:{data['phone'].strip()}")
-    if data.get("phone2"):
-        lines.append(f"TEL;TYPE=WORK:{data['phone2'].strip()}")
-    if data.get("email"):
-        lines.append(f"EMAIL;TYPE=INTERNET:{data['email'].strip()}")
-    if data.get("website"):
-        url = data['website'].strip()
-        if url and not url.startswith("http"):
-            url = "https://" + url
-        lines.append(f"URL:{url}")
-    if data.get("address"):
-        lines.append(f"ADR;TYPE=WORK:;;{data['address'].strip()};;;;")
-    if data.get("linkedin"):
-        lines.append(f"X-SOCIALPROFILE;type=linkedin:{data['linkedin'].strip()}")
-    if data.get("note"):
-        lines.append(f"NOTE:{data['note'].strip()}")
+    for key, tmpl in VCARD_FIELDS:
+        value = data.get(key)
+        if value and (value := value.strip()):
+            if key == "website" and not value.startswith("http"):
+                value = "https://" + value
+            lines.append(tmpl.format(value))
 
     lines.append("END:VCARD")
     return "\r\n".join(lines)
 
 
+# QR rendering is CPU-bound; run it on a bounded pool and let concurrent
+# requests for the same (vcard, color) share a single render.
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _render_qr_png_shared(vcard_str, color_scheme):
+    """Return PNG bytes, joining an in-flight render of the same image if any."""
+    key = (vcard_str, color_scheme)
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(key)
+        if future is None:
+            future = EXECUTOR.submit(_render_qr_png_bytes, vcard_str, color_scheme)
+            _INFLIGHT[key] = future
+    try:
+        return future.result()
+    finally:
+        with _INFLIGHT_LOCK:
+            if _INFLIGHT.get(key) is future:
+                del _INFLIGHT[key]
+
+
 def generate_qr_image(vcard_str, color_scheme):
     """Generate a styled QR code image and return as base64 PNG."""
+    png_bytes = _render_qr_png_shared(vcard_str, color_scheme)
+    return base64.b64encode(png_bytes).decode("utf-8")
 
-    schemes = {
-        "navy":   {"fill": "#0D2B55", "back": "#FFFFFF", "banner": "#0D2B55", "accent": "#F5C842"},
-        "green":  {"fill": "#1A4731", "back": "#FFFFFF", "banner": "#1A4731", "accent": "#4ADE80"},
-        "maroon": {"fill": "#6B0F1A", "back": "#FFFFFF", "banner": "#6B0F1A", "accent": "#FCA5A5"},
-        "black":  {"fill": "#111111", "back": "#FFFFFF", "banner": "#111111", "accent": "#F59E0B"},
-        "purple": {"fill": "#3B0764", "back": "#FFFFFF", "banner": "#3B0764", "accent": "#C084FC"},
-    }
-    scheme = schemes.get(color_scheme, schemes["navy"])
-
-    qr = qrcode.QRCode(
-        version=None,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(vcard_str)
-    qr.make(fit=True)
 
-    qr_img = qr.make_image(
-        fill_color=scheme["fill"],
-        back_color=scheme["back"]
-    ).convert("RGBA")
+@functools.lru_cache(maxsize=512)
+def _render_qr_png_bytes(vcard_str, color_scheme):
+    """Render the styled QR code card and return the raw PNG bytes."""
 
-    qr_w, qr_h = qr_img.size
-    banner_h = 80
-    canvas = Image.new("RGBA", (qr_w, qr_h + banner_h), "#FFFFFF")
-    canvas.paste(qr_img, (0, 0))
+    scheme_name = color_scheme if color_scheme in COLOR_SCHEMES else "navy"
 
-    draw = ImageDraw.Draw(canvas)
-    draw.rectangle([(0, qr_h), (qr_w, qr_h + banner_h)], fill=scheme["banner"])
+    qr = segno.make_qr(_qr_segments(vcard_str), error="h", encoding="utf-8")
 
-    # Fonts
-    try:
-        font_name   = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 17)
-        font_sub    = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
-        font_scan   = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf", 10)
-    except IOError:
-        font_name = font_sub = font_scan = ImageFont.load_default()
+    # One byte per module (0 = light, 1 = dark), then scale up with NEAREST
+    size, _ = qr.symbol_size(scale=1, border=QR_BORDER)
+    modules = Image.frombytes("P", (size, size),
+                              b"".join(bytes(row) for row in qr.matrix_iter(scale=1, border=QR_BORDER)))
+    qr_img = modules.resize((size * QR_BOX_SIZE, size * QR_BOX_SIZE), Image.Resampling.NEAREST)
 
-    def cx(text, font):
-        bb = draw.textbbox((0, 0), text, font=font)
-        return (qr_w - (bb[2] - bb[0])) // 2
-
-    draw.text((cx("Scan to Save Contact", font_name), qr_h + 8),
-              "Scan to Save Contact", font=font_name, fill=scheme["accent"])
-    draw.text((cx("📱 vCard Contact QR Code", font_sub), qr_h + 32),
-              "📱 vCard Contact QR Code", font=font_sub, fill="#FFFFFF")
-    draw.text((cx("Works with iPhone & Android Camera", font_scan), qr_h + 56),
-              "Works with iPhone & Android Camera", font=font_scan, fill="#AACBFF")
+    # Compose the card in palette mode so the PNG writer gets half a byte per pixel
+    qr_w, qr_h = qr_img.size
+    canvas = Image.new("P", (qr_w, qr_h + BANNER_H), 0)
+    canvas.putpalette(SCHEME_PALETTES[scheme_name])
+    canvas.paste(qr_img, (0, 0))
+    canvas.paste(_banner_strip(scheme_name, qr_w), (0, qr_h))
 
     buf = io.BytesIO()
-    canvas.convert("RGB").save(buf, format="PNG", quality=95)
-    buf.seek(0)
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
+    canvas.save(buf, format="PNG", bits=4,
+                compress_level=QR_PNG_COMPRESS_LEVEL, optimize=False)
+    return buf.getvalue()
+
+
+@app.errorhandler(segno.DataOverflowError)
+def qr_data_overflow(error):
+    return jsonify({"error": "Contact details are too long to fit in a QR code"}), 400
 
 
 @app.route("/")
@@ -132,20 +283,41 @@ def generate():
     })
 
 
+@app.route("/vcard", methods=["POST"])
+def vcard():
+    data = request.get_json()
+    if not data or not data.get("name"):
+        return jsonify({"error": "Name is required"}), 400
+
+    return jsonify({
+        "success": True,
+        "vcard":   build_vcard(data),
+    })
+
+
+@app.route("/qr", methods=["POST"])
+def qr_png():
+    # Contact details come in the JSON body, never the URL, so they stay out
+    # of access logs and browser history
+    data = request.get_json()
+    if not data or not data.get("name"):
+        return jsonify({"error": "Name is required"}), 400
+
+    color = data.get("color", "navy")
+    vcard = build_vcard(data)
+    return Response(_render_qr_png_shared(vcard, color), mimetype="image/png")
+
+
 @app.route("/download", methods=["POST"])
 def download():
     data = request.get_json()
     color = data.get("color", "navy")
     vcard = build_vcard(data)
-    img_b64 = generate_qr_image(vcard, color)
-
-    img_bytes = base64.b64decode(img_b64)
-    buf = io.BytesIO(img_bytes)
-    buf.seek(0)
+    png_bytes = _render_qr_png_shared(vcard, color)
 
     name_slug = data.get("name", "contact").replace(" ", "_").lower()
     return send_file(
-        buf,
+        io.BytesIO(png_bytes),
         mimetype="image/png",
         as_attachment=True,
         download_name=f"{name_slug}_qr_contact.png"
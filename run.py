@@ -4,16 +4,126 @@ Tally Trial Balance Extractor
 Aligned with FinancialReview.tsx data structure
 
 Usage: python tally_tb_extractor.py --from 01-04-2024 --to 31-03-2025
+
+Requires: pip install requests pandas numpy xlsxwriter
 """
 
 import requests
 import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
+import xlsxwriter
 import hashlib
 import argparse
 from datetime import datetime
-from dataclasses import dataclass, asdict
-from typing import List, Optional
+from email.message import Message
+from dataclasses import dataclass, fields
+from typing import AnyStr, Iterable, Iterator, List, Optional
+
+
+# Rows inspected when sizing Excel columns
+WIDTH_SAMPLE_ROWS = 200
+
+# Bytes read from the Tally response per parser feed
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+
+# Static request bodies; only the trial balance dates vary between calls.
+# str.format rather than string.Template, since TDL uses $ for its own fields.
+_TEST_CONN_XML = b"""\
+<ENVELOPE>
+    <HEADER>
+        <VERSION>1</VERSION>
+        <TALLYREQUEST>Export</TALLYREQUEST>
+        <TYPE>Function</TYPE>
+        <ID>$$CurrentCompany</ID>
+    </HEADER>
+    <BODY></BODY>
+</ENVELOPE>
+"""
+
+_TB_XML_TMPL = """\
+<ENVELOPE>
+    <HEADER>
+        <VERSION>1</VERSION>
+        <TALLYREQUEST>Export</TALLYREQUEST>
+        <TYPE>Collection</TYPE>
+        <ID>TrialBalanceCollection</ID>
+    </HEADER>
+    <BODY>
+        <DESC>
+            <STATICVARIABLES>
+                <SVEXPORTFORMAT>$$SysName:XML</SVEXPORTFORMAT>
+                <SVFROMDATE>{from_date}</SVFROMDATE>
+                <SVTODATE>{to_date}</SVTODATE>
+            </STATICVARIABLES>
+            <TDL>
+                <TDLMESSAGE>
+                    <COLLECTION NAME="TrialBalanceCollection" ISMODIFY="No">
+                        <TYPE>Ledger</TYPE>
+                        <NATIVEMETHOD>Name</NATIVEMETHOD>
+                        <NATIVEMETHOD>Parent</NATIVEMETHOD>
+                        <NATIVEMETHOD>OpeningBalance</NATIVEMETHOD>
+                        <NATIVEMETHOD>ClosingBalance</NATIVEMETHOD>
+                        <NATIVEMETHOD>IsRevenue</NATIVEMETHOD>
+                    </COLLECTION>
+
+                    <PART NAME="TBExport">
+                        <TOPPARTS>TBExport</TOPPARTS>
+                        <XMLTAG>ENVELOPE</XMLTAG>
+                    </PART>
+
+                    <LINE NAME="TBLine">
+                        <FIELDS>FldName, FldParent, FldPrimaryGroup</FIELDS>
+                        <FIELDS>FldOpening, FldDebit, FldCredit, FldClosing</FIELDS>
+                        <FIELDS>FldIsRevenue</FIELDS>
+                    </LINE>
+
+                    <FIELD NAME="FldName">
+                        <SET>$Name</SET>
+                        <XMLTAG>LEDGERNAME</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldParent">
+                        <SET>$Parent</SET>
+                        <XMLTAG>PARENT</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldPrimaryGroup">
+                        <SET>$$PrimaryGroup:$Name</SET>
+                        <XMLTAG>PRIMARYGROUP</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldOpening">
+                        <SET>$OpeningBalance</SET>
+                        <XMLTAG>OPENINGBALANCE</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldDebit">
+                        <SET>$$TotDebit:$Name</SET>
+                        <XMLTAG>TOTALDEBIT</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldCredit">
+                        <SET>$$TotCredit:$Name</SET>
+                        <XMLTAG>TOTALCREDIT</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldClosing">
+                        <SET>$ClosingBalance</SET>
+                        <XMLTAG>CLOSINGBALANCE</XMLTAG>
+                    </FIELD>
+
+                    <FIELD NAME="FldIsRevenue">
+                        <SET>$IsRevenue</SET>
+                        <XMLTAG>ISREVENUE</XMLTAG>
+                    </FIELD>
+                </TDLMESSAGE>
+            </TDL>
+        </DESC>
+    </BODY>
+</ENVELOPE>
+"""
 
 
 @dataclass
@@ -57,27 +167,46 @@ class LedgerRow:
     sheet_name: str = 'TB CY'  # 'Sheet Name'
     auto: str = ''             # 'Auto'
     auto_reason: str = ''      # 'Auto Reason'
-    
-    def to_excel_dict(self) -> dict:
-        """Convert to Excel-compatible dictionary with original column names"""
-        return {
-            'Ledger Name': self.ledger_name,
-            'Primary Group': self.primary_group,
-            'Parent Group': self.parent_group,
-            'Composite Key': self.composite_key,
-            'Opening Balance': self.opening_balance,
-            'Debit': self.debit,
-            'Credit': self.credit,
-            'Closing Balance': self.closing_balance,
-            'ABS Opening Balance': self.abs_opening_balance,
-            'ABS Closing Balance': self.abs_closing_balance,
-            'Is Revenue': self.is_revenue,
-            'H1': self.h1,
-            'H2': self.h2,
-            'H3': self.h3,
-            'Notes': self.notes,
-            'Sheet Name': self.sheet_name,
-        }
+
+
+# LedgerRow field -> Excel column, in export order
+LEDGER_ROW_EXCEL_COLUMNS = {
+    'ledger_name': 'Ledger Name',
+    'primary_group': 'Primary Group',
+    'parent_group': 'Parent Group',
+    'composite_key': 'Composite Key',
+    'opening_balance': 'Opening Balance',
+    'debit': 'Debit',
+    'credit': 'Credit',
+    'closing_balance': 'Closing Balance',
+    'abs_opening_balance': 'ABS Opening Balance',
+    'abs_closing_balance': 'ABS Closing Balance',
+    'is_revenue': 'Is Revenue',
+    'h1': 'H1',
+    'h2': 'H2',
+    'h3': 'H3',
+    'notes': 'Notes',
+    'sheet_name': 'Sheet Name',
+}
+
+# Minimal columns for actual TB
+LEDGER_ROW_TB_COLUMNS = {
+    'ledger_name': 'Ledger Name',
+    'parent_group': 'Parent Group',
+    'primary_group': 'Primary Group',
+    'opening_balance': 'Opening Balance',
+    'debit': 'Debit',
+    'credit': 'Credit',
+    'closing_balance': 'Closing Balance',
+    'is_revenue': 'Is Revenue',
+}
+
+
+def _header_charset(content_type: str) -> Optional[str]:
+    """Return the charset named in a Content-Type header, if any"""
+    message = Message()
+    message['Content-Type'] = content_type
+    return message.get_content_charset()
 
 
 def generate_ledger_key(ledger_name: str, primary_group: str) -> str:
@@ -86,7 +215,8 @@ def generate_ledger_key(ledger_name: str, primary_group: str) -> str:
     Creates a unique composite key for each ledger
     """
     combined = f"{ledger_name.strip().lower()}|{primary_group.strip().lower()}"
-    return hashlib.md5(combined.encode()).hexdigest()[:16]
+    # Not a security use; the flag keeps MD5 available on FIPS-restricted hosts
+    return hashlib.md5(combined.encode(), usedforsecurity=False).hexdigest()[:16]
 
 
 def derive_h1_from_revenue_and_balance(is_revenue: bool, closing_balance: float, opening_balance: float) -> str:
@@ -103,6 +233,24 @@ def derive_h1_from_revenue_and_balance(is_revenue: bool, closing_balance: float,
         return 'Asset' if is_debit else 'Liability'
 
 
+def _derive_h1_columns(
+    is_revenue: pd.Series,
+    closing_balance: pd.Series,
+    opening_balance: pd.Series
+) -> np.ndarray:
+    """
+    derive_h1_from_revenue_and_balance() applied element-wise over whole columns
+    """
+    sign_value = np.where(closing_balance != 0, closing_balance, opening_balance)
+    is_debit = sign_value < 0
+    
+    return np.select(
+        [is_revenue & is_debit, is_revenue & ~is_debit, ~is_revenue & is_debit],
+        ['Expense', 'Income', 'Asset'],
+        default='Liability'
+    )
+
+
 class TallyConnector:
     """
     Tally HTTP/XML API Connector
@@ -111,6 +259,15 @@ class TallyConnector:
     
     def __init__(self, host: str = "localhost", port: int = 9000):
         self.base_url = f"http://{host}:{port}"
+        
+        # Keep the TCP connection to Tally alive across test/fetch calls
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Content-Type": "application/xml",
+            "Connection": "keep-alive",
+        })
         self.company_name: Optional[str] = None
     
     def test_connection(self) -> bool:
@@ -118,21 +275,9 @@ class TallyConnector:
         Matches: testConnection() in useTallyODBC.ts
         """
         try:
-            xml_request = """
-            <ENVELOPE>
-                <HEADER>
-                    <VERSION>1</VERSION>
-                    <TALLYREQUEST>Export</TALLYREQUEST>
-                    <TYPE>Function</TYPE>
-                    <ID>$$CurrentCompany</ID>
-                </HEADER>
-                <BODY></BODY>
-            </ENVELOPE>
-            """
-            response = requests.post(
+            response = self.session.post(
                 self.base_url,
-                data=xml_request,
-                headers={"Content-Type": "application/xml"},
+                data=_TEST_CONN_XML,
                 timeout=10
             )
             
@@ -163,156 +308,118 @@ class TallyConnector:
         Returns:
             Tuple of (list of TallyTrialBalanceLine, company_name)
         """
-        xml_request = f"""
-        <ENVELOPE>
-            <HEADER>
-                <VERSION>1</VERSION>
-                <TALLYREQUEST>Export</TALLYREQUEST>
-                <TYPE>Collection</TYPE>
-                <ID>TrialBalanceCollection</ID>
-            </HEADER>
-            <BODY>
-                <DESC>
-                    <STATICVARIABLES>
-                        <SVEXPORTFORMAT>$$SysName:XML</SVEXPORTFORMAT>
-                        <SVFROMDATE>{from_date}</SVFROMDATE>
-                        <SVTODATE>{to_date}</SVTODATE>
-                    </STATICVARIABLES>
-                    <TDL>
-                        <TDLMESSAGE>
-                            <COLLECTION NAME="TrialBalanceCollection" ISMODIFY="No">
-                                <TYPE>Ledger</TYPE>
-                                <NATIVEMETHOD>Name</NATIVEMETHOD>
-                                <NATIVEMETHOD>Parent</NATIVEMETHOD>
-                                <NATIVEMETHOD>OpeningBalance</NATIVEMETHOD>
-                                <NATIVEMETHOD>ClosingBalance</NATIVEMETHOD>
-                                <NATIVEMETHOD>IsRevenue</NATIVEMETHOD>
-                            </COLLECTION>
-                            
-                            <PART NAME="TBExport">
-                                <TOPPARTS>TBExport</TOPPARTS>
-                                <XMLTAG>ENVELOPE</XMLTAG>
-                            </PART>
-                            
-                            <LINE NAME="TBLine">
-                                <FIELDS>FldName, FldParent, FldPrimaryGroup</FIELDS>
-                                <FIELDS>FldOpening, FldDebit, FldCredit, FldClosing</FIELDS>
-                                <FIELDS>FldIsRevenue</FIELDS>
-                            </LINE>
-                            
-                            <FIELD NAME="FldName">
-                                <SET>$Name</SET>
-                                <XMLTAG>LEDGERNAME</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldParent">
-                                <SET>$Parent</SET>
-                                <XMLTAG>PARENT</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldPrimaryGroup">
-                                <SET>$$PrimaryGroup:$Name</SET>
-                                <XMLTAG>PRIMARYGROUP</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldOpening">
-                                <SET>$OpeningBalance</SET>
-                                <XMLTAG>OPENINGBALANCE</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldDebit">
-                                <SET>$$TotDebit:$Name</SET>
-                                <XMLTAG>TOTALDEBIT</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldCredit">
-                                <SET>$$TotCredit:$Name</SET>
-                                <XMLTAG>TOTALCREDIT</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldClosing">
-                                <SET>$ClosingBalance</SET>
-                                <XMLTAG>CLOSINGBALANCE</XMLTAG>
-                            </FIELD>
-                            
-                            <FIELD NAME="FldIsRevenue">
-                                <SET>$IsRevenue</SET>
-                                <XMLTAG>ISREVENUE</XMLTAG>
-                            </FIELD>
-                        </TDLMESSAGE>
-                    </TDL>
-                </DESC>
-            </BODY>
-        </ENVELOPE>
-        """
+        xml_request = _TB_XML_TMPL.format(from_date=from_date, to_date=to_date)
         
         try:
-            response = requests.post(
+            # Stream the body into the parser instead of buffering response.text
+            with self.session.post(
                 self.base_url,
                 data=xml_request,
-                headers={"Content-Type": "application/xml"},
-                timeout=120
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"HTTP Error: {response.status_code}")
-            
-            lines = self._parse_tally_response(response.text)
+                timeout=120,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    raise Exception(f"HTTP Error: {response.status_code}")
+                
+                # Honour the HTTP charset as response.text did; without one,
+                # raw bytes go to the parser and the XML declaration decides
+                charset = _header_charset(response.headers.get('Content-Type', ''))
+                if charset:
+                    response.encoding = charset
+                chunks = response.iter_content(
+                    chunk_size=RESPONSE_CHUNK_SIZE,
+                    decode_unicode=bool(charset)
+                )
+                lines = self._parse_tally_response(chunks)
             return lines, self.company_name or ''
             
         except Exception as e:
             print(f"Error fetching trial balance: {e}")
             return [], ''
     
-    def _parse_tally_response(self, xml_text: str) -> List[TallyTrialBalanceLine]:
+    def _parse_tally_response(self, chunks: Iterable[AnyStr]) -> List[TallyTrialBalanceLine]:
         """
         Parse Tally XML response into TallyTrialBalanceLine objects
+        `chunks` is the response body in pieces; str chunks override the
+        encoding given in the XML declaration
         """
-        lines = []
-        
         try:
-            root = ET.fromstring(xml_text)
-            
-            # Find all LEDGER elements
-            for ledger in root.findall('.//LEDGER'):
-                name = (
-                    ledger.findtext('LEDGERNAME') or 
-                    ledger.findtext('NAME') or 
-                    ''
-                ).strip()
-                
-                if not name:
+            return list(self._iter_tally_ledgers(chunks))
+        except ET.ParseError as e:
+            # A truncated trial balance is worse than none at all
+            print(f"XML Parse Error: {e}")
+            return []
+    
+    def _iter_tally_ledgers(self, chunks: Iterable[AnyStr]) -> Iterator[TallyTrialBalanceLine]:
+        """
+        Yield TallyTrialBalanceLine objects while the XML is being read
+        Each LEDGER is detached from its parent once read, so memory stays
+        flat however many ledgers the document holds
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        # Open elements from the root down; the parent of a finished
+        # LEDGER is the entry just above it
+        open_elements = []
+        
+        def ledgers():
+            for event, element in parser.read_events():
+                if event == 'start':
+                    open_elements.append(element)
                     continue
                 
-                parent = (ledger.findtext('PARENT') or '').strip()
-                primary_group = (ledger.findtext('PRIMARYGROUP') or '').strip()
-                
-                opening = self._parse_amount(ledger.findtext('OPENINGBALANCE', '0'))
-                debit = self._parse_amount(ledger.findtext('TOTALDEBIT', '0'))
-                credit = self._parse_amount(ledger.findtext('TOTALCREDIT', '0'))
-                closing = self._parse_amount(ledger.findtext('CLOSINGBALANCE', '0'))
-                
-                is_revenue_text = (ledger.findtext('ISREVENUE') or 'No').strip().lower()
-                is_revenue = is_revenue_text in ('yes', 'true', '1')
+                open_elements.pop()
+                if element.tag != 'LEDGER':
+                    continue
                 
-                lines.append(TallyTrialBalanceLine(
-                    accountHead=name,
-                    openingBalance=opening,
-                    totalDebit=abs(debit),
-                    totalCredit=abs(credit),
-                    closingBalance=closing,
-                    accountCode='',
-                    branch='',
-                    primaryGroup=primary_group or parent,
-                    parent=parent,
-                    isRevenue=is_revenue
-                ))
+                line = self._ledger_to_line(element)
+                if line is not None:
+                    yield line
+                if open_elements:
+                    open_elements[-1].remove(element)
         
-        except ET.ParseError as e:
-            print(f"XML Parse Error: {e}")
-            print(f"Response preview: {xml_text[:500]}...")
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from ledgers()
+        parser.close()
+        yield from ledgers()
+    
+    def _ledger_to_line(self, ledger) -> Optional[TallyTrialBalanceLine]:
+        """
+        Convert a single LEDGER element into a TallyTrialBalanceLine
+        Returns None for ledgers without a name
+        """
+        name = (
+            ledger.findtext('LEDGERNAME') or 
+            ledger.findtext('NAME') or 
+            ''
+        ).strip()
+        
+        if not name:
+            return None
+        
+        parent = (ledger.findtext('PARENT') or '').strip()
+        primary_group = (ledger.findtext('PRIMARYGROUP') or '').strip()
         
-        return lines
+        opening = self._parse_amount(ledger.findtext('OPENINGBALANCE', '0'))
+        debit = self._parse_amount(ledger.findtext('TOTALDEBIT', '0'))
+        credit = self._parse_amount(ledger.findtext('TOTALCREDIT', '0'))
+        closing = self._parse_amount(ledger.findtext('CLOSINGBALANCE', '0'))
+        
+        is_revenue_text = (ledger.findtext('ISREVENUE') or 'No').strip().lower()
+        is_revenue = is_revenue_text in ('yes', 'true', '1')
+        
+        return TallyTrialBalanceLine(
+            accountHead=name,
+            openingBalance=opening,
+            totalDebit=abs(debit),
+            totalCredit=abs(credit),
+            closingBalance=closing,
+            accountCode='',
+            branch='',
+            primaryGroup=primary_group or parent,
+            parent=parent,
+            isRevenue=is_revenue
+        )
     
     def _parse_amount(self, amount_str: str) -> float:
         """
@@ -347,98 +454,98 @@ class TallyConnector:
 def process_tally_lines_to_ledger_rows(
     lines: List[TallyTrialBalanceLine],
     period_type: str = 'current'
-) -> List[LedgerRow]:
+) -> pd.DataFrame:
     """
     Matches: handleFetchFromTally() transformation in FinancialReview.tsx
     
-    Converts TallyTrialBalanceLine to LedgerRow format
+    Converts TallyTrialBalanceLine to LedgerRow format, column-wise.
+    Returns a DataFrame with one column per LedgerRow field.
     """
-    ledger_rows = []
+    # Plain per-field lists; cheaper than asdict() (which deep-copies every
+    # value) and than iterating pandas string columns afterwards
+    columns = {
+        f.name: [getattr(line, f.name) for line in lines]
+        for f in fields(TallyTrialBalanceLine)
+    }
+    tb = pd.DataFrame(columns)
+    is_revenue = tb['isRevenue'].astype(bool)
     
-    for line in lines:
-        # Generate composite key (matches generateLedgerKey)
-        composite_key = generate_ledger_key(line.accountHead, line.primaryGroup)
-        
-        # Derive H1 classification (matches deriveH1FromRevenueAndBalance)
-        h1 = derive_h1_from_revenue_and_balance(
-            line.isRevenue,
-            line.closingBalance,
-            line.openingBalance
-        )
-        
-        ledger_row = LedgerRow(
-            ledger_name=line.accountHead,
-            primary_group=line.primaryGroup,
-            parent_group=line.parent,
-            composite_key=composite_key,
-            opening_balance=line.openingBalance,
-            debit=abs(line.totalDebit),
-            credit=abs(line.totalCredit),
-            closing_balance=line.closingBalance,
-            abs_opening_balance=abs(line.openingBalance),
-            abs_closing_balance=abs(line.closingBalance),
-            is_revenue='Yes' if line.isRevenue else 'No',
-            h1=h1,
-            sheet_name='TB CY' if period_type == 'current' else 'TB PY'
-        )
-        
-        ledger_rows.append(ledger_row)
+    rows = pd.DataFrame({
+        'ledger_name': tb['accountHead'],
+        'primary_group': tb['primaryGroup'],
+        'parent_group': tb['parent'],
+        'composite_key': [
+            generate_ledger_key(name, group)
+            for name, group in zip(columns['accountHead'], columns['primaryGroup'])
+        ],
+        'opening_balance': tb['openingBalance'],
+        'debit': tb['totalDebit'].abs(),
+        'credit': tb['totalCredit'].abs(),
+        'closing_balance': tb['closingBalance'],
+        'abs_opening_balance': tb['openingBalance'].abs(),
+        'abs_closing_balance': tb['closingBalance'].abs(),
+        'is_revenue': np.where(is_revenue, 'Yes', 'No'),
+        'h1': _derive_h1_columns(
+            is_revenue, tb['closingBalance'], tb['openingBalance']
+        ),
+    })
     
-    return ledger_rows
+    # Remaining LedgerRow fields keep their dataclass defaults
+    for f in fields(LedgerRow):
+        if f.name not in rows:
+            rows[f.name] = f.default
+    rows['sheet_name'] = 'TB CY' if period_type == 'current' else 'TB PY'
+    
+    return rows[[f.name for f in fields(LedgerRow)]]
 
 
-def filter_classified_rows(rows: List[LedgerRow]) -> List[LedgerRow]:
+def filter_classified_rows(rows: pd.DataFrame) -> pd.DataFrame:
     """
     Matches: filterClassifiedRows() from FinancialReview.tsx
     Filters out rows where both opening and closing are zero
     """
-    return [
-        row for row in rows
-        if row.opening_balance != 0 or row.closing_balance != 0
-    ]
+    return rows[(rows['opening_balance'] != 0) | (rows['closing_balance'] != 0)]
 
 
 def export_to_excel(
-    rows: List[LedgerRow],
+    rows: pd.DataFrame,
     filename: str,
     include_all_columns: bool = True
 ):
     """
-    Export LedgerRows to Excel matching the React app's export format
+    Export ledger rows to Excel matching the React app's export format
     """
-    if include_all_columns:
-        data = [row.to_excel_dict() for row in rows]
-    else:
-        # Minimal columns for actual TB
-        data = [{
-            'Ledger Name': row.ledger_name,
-            'Parent Group': row.parent_group,
-            'Primary Group': row.primary_group,
-            'Opening Balance': row.opening_balance,
-            'Debit': row.debit,
-            'Credit': row.credit,
-            'Closing Balance': row.closing_balance,
-            'Is Revenue': row.is_revenue,
-        } for row in rows]
-    
-    df = pd.DataFrame(data)
+    columns = LEDGER_ROW_EXCEL_COLUMNS if include_all_columns else LEDGER_ROW_TB_COLUMNS
+    df = rows[list(columns)].rename(columns=columns)
     
     # Sort by Primary Group, then Ledger Name (similar to React sorting)
     df = df.sort_values(['Primary Group', 'Ledger Name'])
     
-    # Export with formatting
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Trial Balance', index=False)
+    # Export with formatting; constant_memory streams each row to disk as it
+    # is written, so rows must go out in order (pandas writes column by column)
+    # strings_to_urls off: ledger and group names stay plain text, as with openpyxl
+    workbook = xlsxwriter.Workbook(filename, {
+        'constant_memory': True,
+        'strings_to_urls': False,
+    })
+    try:
+        worksheet = workbook.add_worksheet('Trial Balance')
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
         
-        # Auto-adjust column widths
-        worksheet = writer.sheets['Trial Balance']
+        # Auto-adjust column widths from a sample of rows
+        sample = df.head(WIDTH_SAMPLE_ROWS)
         for idx, col in enumerate(df.columns):
             max_length = max(
-                df[col].astype(str).map(len).max(),
+                max((len(str(value)) for value in sample[col]), default=0),
                 len(col)
             ) + 2
-            col_letter = chr(65 + idx) if idx < 26 else f"{chr(65 + idx // 26 - 1)}{chr(65 + idx % 26)}"
-            worksheet.column_dimensions[col_letter].width = min(max_length, 50)
+            worksheet.set_column(idx, idx, min(max_length, 50))
+        
+        worksheet.write_row(0, 0, df.columns, header_format)
+        for row_idx, values in enumerate(df.itertuples(index=False), start=1):
+            worksheet.write_row(row_idx, 0, values)
+    finally:
+        workbook.close()
     
     return df
 